@@ -4,6 +4,8 @@ import requests
 import time
 import sys
 import asyncio
+from collections import defaultdict, deque
+from contextlib import contextmanager, nullcontext
 from telegram import Update, ForceReply
 from telegram.ext import (
     ApplicationBuilder,
@@ -17,10 +19,45 @@ from datetime import datetime, timedelta
 
 DB_NAME = "price_tracker.db"
 
+class StageTimer:
+    def __init__(self, maxlen=1000):
+        self.samples = defaultdict(lambda: deque(maxlen=maxlen))
+
+    @contextmanager
+    def measure(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[stage].append(time.perf_counter() - start)
+
+    def percentile(self, stage, q):
+        values = sorted(self.samples.get(stage, ()))
+        if not values:
+            return None
+        return values[min(len(values) - 1, round(q / 100 * (len(values) - 1)))]
+
+    def report(self):
+        lines = []
+        for stage in sorted(self.samples.copy()):
+            lines.append(
+                f"{stage}: n={len(self.samples[stage])} "
+                f"p50={self.percentile(stage, 50) * 1000:.3f} мс "
+                f"p99={self.percentile(stage, 99) * 1000:.3f} мс"
+            )
+        return "\n".join(lines)
+
 class Database:
-    def __init__(self):
-        self.conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+    def __init__(self, db_name=DB_NAME, timer=None):
+        self.conn = sqlite3.connect(db_name, check_same_thread=False)
+        self.timer = timer
         self._create_tables()
+        self._load_cache()
+
+    def _timed(self, stage):
+        if self.timer is None:
+            return nullcontext()
+        return self.timer.measure("db." + stage)
 
     def _create_tables(self):
         with self.conn:
@@ -73,28 +110,55 @@ class Database:
                 ("BRENT", 0, "https://www.rbc.ru/quote/ticker/181206",
                  "<span class=\"chart__info__sum\">[\s\S]*?([\d\s]+,\d+)", "USD.")
             )
-            
+
+    def _load_cache(self):
+        # Справочник предметов, подписки и последние цены держим в памяти,
+        # чтобы обработчики команд не обращались к sqlite.
+        self._items = {}
+        self._item_ids = {}
+        self._subscriptions = {}
+        self._latest_prices = {}
+        with self._timed("load_cache"), self.conn:
+            for item_id, name, currency in self.conn.execute(
+                    "SELECT item_id, name, currency FROM items ORDER BY item_id"):
+                self._items[item_id] = (name, currency)
+                self._item_ids[name] = item_id
+            for user_id, item_id in self.conn.execute(
+                    "SELECT user_id, item_id FROM subscriptions"):
+                self._subscriptions[user_id] = item_id
+            for item_id, price in self.conn.execute("""
+                    SELECT item_id, price
+                    FROM price_history
+                    WHERE price_history_id IN (
+                        SELECT MAX(price_history_id)
+                        FROM price_history
+                        GROUP BY item_id
+                    )
+                """):
+                self._latest_prices[item_id] = price
 
     def add_user(self, user_id, username):
-        with self.conn:
+        with self._timed("add_user"), self.conn:
             self.conn.execute(
                 "INSERT OR IGNORE INTO users (user_id, username) VALUES (?, ?)",
                 (user_id, username)
             )
 
     def add_subscription(self, user_id, item_id):
-        with self.conn:
+        with self._timed("add_subscription"), self.conn:
             self.conn.execute(
                 "INSERT OR IGNORE INTO subscriptions (user_id, item_id) VALUES (?, ?)",
                 (user_id, item_id)
             )
+        self._subscriptions.setdefault(user_id, item_id)
 
     def add_price(self, item_id, price):
-        with self.conn:
+        with self._timed("add_price"), self.conn:
             self.conn.execute(
                 "INSERT INTO price_history (item_id, price) VALUES (?, ?)",
                 (item_id, price)
             )
+        self._latest_prices[item_id] = price
 
     def get_price_history(self, item_id, days):
         if days < 1:
@@ -102,7 +166,7 @@ class Database:
         current_date = datetime.now()
         result_date = current_date - timedelta(days=days)
         sql_date = result_date.strftime("%Y-%m-%d %H:%M:%S")
-        with self.conn:
+        with self._timed("get_price_history"), self.conn:
             cursor = self.conn.execute("""
                 SELECT price, timestamp 
                 FROM price_history 
@@ -112,22 +176,17 @@ class Database:
             return cursor.fetchall()
 
     def get_user_subscription(self, user_id):
-        with self.conn:
-            cursor = self.conn.execute(
-                "SELECT item_id FROM subscriptions WHERE user_id = ?",
-                (user_id,))
-            result = cursor.fetchone()
-            return result[0] if result else None
+        return self._subscriptions.get(user_id)
 
     def set_error(self, item_id):
-        with self.conn:
+        with self._timed("set_error"), self.conn:
             self.conn.execute(
                 "UPDATE items SET error = TRUE WHERE item_id = (?)",
                 (item_id,)
             )
 
     def get_prices(self):
-        with self.conn:
+        with self._timed("get_prices"), self.conn:
             cursor = self.conn.execute("""
                 SELECT item_id, html_page, reg_exp, error
                 FROM items
@@ -135,64 +194,50 @@ class Database:
             return cursor.fetchall()
     
     def get_items(self):
-        with self.conn:
-            cursor = self.conn.execute("""
-                SELECT item_id, name FROM items
-            """)
-            return cursor.fetchall()
+        return [(item_id, item[0]) for item_id, item in self._items.items()]
 
     def get_item_id(self, name):
-        with self.conn:
-            cursor = self.conn.execute(
-                "SELECT item_id FROM items WHERE name = ?",
-            (name,))
-            result = cursor.fetchone()
-            return result[0] if result else None
+        return self._item_ids.get(name)
 
     def get_currency(self, item_id):
-        with self.conn:
-            cursor = self.conn.execute(
-                "SELECT currency FROM items WHERE item_id = ?",
-            (item_id,))
-            return cursor.fetchone()
+        item = self._items.get(item_id)
+        return (item[1],) if item else None
 
     def delete_subs_for_user(self, user_id):
-        with self.conn:
+        with self._timed("delete_subs_for_user"), self.conn:
             self.conn.execute(
             "DELETE FROM subscriptions WHERE user_id = ?",
             (user_id,)
         )
+        self._subscriptions.pop(user_id, None)
 
     def get_all_subscriptions(self):
-        with self.conn:
-            cursor = self.conn.execute("SELECT user_id, item_id FROM subscriptions")
-            return cursor.fetchall()
+        return list(self._subscriptions.items())
 
     def get_latest_price(self, item_id):
-        with self.conn:
-            cursor = self.conn.execute("""
-                SELECT price 
-                FROM price_history 
-                WHERE item_id = ? 
-                ORDER BY timestamp DESC 
-                LIMIT 1
-            """, (item_id,))
-            result = cursor.fetchone()
-            return result[0] if result else None
+        return self._latest_prices.get(item_id)
 
 class PageParser:
-    def __init__(self, updatetime):
+    def __init__(self, updatetime, timer=None):
         self.updatetime = updatetime
+        self.timer = timer
+
+    def _timed(self, stage):
+        if self.timer is None:
+            return nullcontext()
+        return self.timer.measure("parser." + stage)
 
     def getValueFromWeb(self, page, regexp):
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win32; x32) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
-        response = requests.get(page, headers=headers)
-        response.raise_for_status()
-        html = response.text
-        pattern = re.compile(regexp)
-        match = pattern.findall(html)
+        with self._timed("fetch"):
+            response = requests.get(page, headers=headers)
+            response.raise_for_status()
+            html = response.text
+        with self._timed("parse"):
+            pattern = re.compile(regexp)
+            match = pattern.findall(html)
         s=str()
         if match:
             for i in match:
@@ -203,8 +248,8 @@ class PageParser:
             value = float(s)
             return value
 
-    def run(self, db):
-        while True:
+    def run_once(self, db):
+        with self._timed("cycle"):
             prs = db.get_prices()
             for p in prs:
                 idd, html, re, er = p
@@ -218,6 +263,12 @@ class PageParser:
                 except Exception as e:
                     print(f'Ошибка: {e}')
                     db.set_error(idd)
+
+    def run(self, db):
+        while True:
+            self.run_once(db)
+            if self.timer is not None:
+                print(self.timer.report())
             time.sleep(self.updatetime)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -353,8 +404,9 @@ async def main(token):
 
 if __name__ == "__main__":
     token = sys.argv[1]
-    db = Database()
-    pp = PageParser(30)
+    timer = StageTimer() if "--timings" in sys.argv[2:] else None
+    db = Database(timer=timer)
+    pp = PageParser(30, timer=timer)
     
     try:
         asyncio.run(main(token))
@@ -0,0 +1,147 @@
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import kurs
+from kurs import Database, PageParser, StageTimer
+
+# Страницы, подставляемые вместо живых сайтов, если не задан каталог с сохранёнными HTML
+SYNTHETIC_PAGES = {
+    "USD": "<table><tr><td>840</td><td>USD</td><td>1</td><td>Доллар США</td><td>92,5012</td></tr></table>",
+    "EUR": "<table><tr><td>978</td><td>EUR</td><td>1</td><td>Евро</td><td>100,1234</td></tr></table>",
+    "BRENT": "<div><span class=\"chart__info__sum\">\n  78,45</span></div>",
+}
+
+
+def load_pages(pages_dir):
+    if pages_dir is None:
+        return dict(SYNTHETIC_PAGES)
+    pages = {}
+    for name in os.listdir(pages_dir):
+        if name.endswith(".html"):
+            with open(os.path.join(pages_dir, name), encoding="utf-8") as f:
+                pages[name[:-len(".html")]] = f.read()
+    return pages
+
+
+def start_stub_server(pages):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = pages.get(self.path.strip("/"))
+            if body is None:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class FakeMessage:
+    def __init__(self, text=None):
+        self.text = text
+        self.replies = []
+
+    async def reply_text(self, text):
+        self.replies.append(text)
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id, text):
+        self.sent += 1
+
+
+def make_update(user_id, text=None):
+    user = SimpleNamespace(id=user_id, username=f"user{user_id}", first_name=f"User {user_id}")
+    return SimpleNamespace(effective_user=user, message=FakeMessage(text))
+
+
+async def timed_handler(timer, stage, handler, update, context):
+    with timer.measure("handler." + stage):
+        return await handler(update, context)
+
+
+async def simulate_user(timer, rng, user_id, rounds, item_names):
+    context = SimpleNamespace(user_data={}, bot_data={"db": kurs.db}, bot=FakeBot())
+    await kurs.start(make_update(user_id), context)
+    for _ in range(rounds):
+        await timed_handler(timer, "sub", kurs.sub_command, make_update(user_id, "/sub"), context)
+        await timed_handler(timer, "sub_item", kurs.sub_command2,
+                            make_update(user_id, rng.choice(item_names)), context)
+        await timed_handler(timer, "hist", kurs.show_command, make_update(user_id, "/hist"), context)
+        await timed_handler(timer, "hist_days", kurs.show_command2,
+                            make_update(user_id, str(rng.randint(1, 30))), context)
+        await timed_handler(timer, "list", kurs.list_command, make_update(user_id, "/list"), context)
+        context.user_data.clear()
+
+
+async def run_bench(args, db, timer):
+    item_names = [name for _, name in db.get_items()] + ["UNKNOWN"]
+    rng = random.Random(args.seed)
+    await asyncio.gather(*(
+        simulate_user(timer, rng, user_id, args.rounds, item_names)
+        for user_id in range(1, args.users + 1)
+    ))
+    bot = FakeBot()
+    context = SimpleNamespace(user_data={}, bot_data={"db": db}, bot=bot)
+    with timer.measure("job.send_price_updates"):
+        await kurs.send_price_updates(context)
+    return bot.sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота kurs.py без Telegram и сети")
+    parser.add_argument("--users", type=int, default=100, help="число симулируемых пользователей")
+    parser.add_argument("--rounds", type=int, default=10, help="число циклов /sub, /hist, /list на пользователя")
+    parser.add_argument("--cycles", type=int, default=5, help="число циклов парсинга страниц")
+    parser.add_argument("--seed", type=int, default=0, help="зерно генератора нагрузки")
+    parser.add_argument("--pages", help="каталог с сохранёнными страницами <ПРЕДМЕТ>.html")
+    args = parser.parse_args()
+
+    server = start_stub_server(load_pages(args.pages))
+    timer = StageTimer(maxlen=None)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"), timer=timer)
+        with db.conn:
+            for item_id, name in db.get_items():
+                db.conn.execute(
+                    "UPDATE items SET html_page = ? WHERE item_id = ?",
+                    (f"http://127.0.0.1:{server.server_port}/{name}", item_id)
+                )
+        kurs.db = db
+
+        pp = PageParser(0, timer=timer)
+        for _ in range(args.cycles):
+            pp.run_once(db)
+
+        start = time.perf_counter()
+        sent = asyncio.run(run_bench(args, db, timer))
+        elapsed = time.perf_counter() - start
+        db.conn.close()
+    server.shutdown()
+
+    print(f"Пользователей: {args.users}, циклов: {args.rounds}, время: {elapsed:.3f} с, "
+          f"отправлено уведомлений: {sent}")
+    print(timer.report())
+
+
+if __name__ == "__main__":
+    main()